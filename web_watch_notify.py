@@ -3,18 +3,28 @@ Module to monitor file changes on a website and send alerts via Telegram.
 """
 
 import argparse
-import json
+import asyncio
+import codecs
+import random
+import sqlite3
 import sys
-import time
-from dataclasses import dataclass
-from typing import Callable, List, Any
-
-import requests
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import msgspec
+import orjson
 import schedule
 from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EncodingDetector
+from lxml import etree  # type: ignore # external lib
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class StepParams:
     """
     Represents parameters for a step in a configuration for automated tasks.
@@ -28,7 +38,7 @@ class StepParams:
     name: str = ""
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Step:
     """
     Represents a step in a configuration for automated tasks.
@@ -39,10 +49,10 @@ class Step:
     """
 
     method: str
-    params: StepParams
+    params: StepParams = field(default_factory=StepParams)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Config:
     """
     Configuration for a specific automation task.
@@ -55,6 +65,12 @@ class Config:
         read_bot_token (str): The read-only bot token for Telegram bot integration.
         chat_id (str): The chat ID where the bot should send messages.
         schedule_interval (str): The scheduling interval (e.g., '1' for every minute).
+        xpath (Optional[etree.XPath]): The steps fused into a single XPath, if they can be.
+        send_document_url (httpx.URL): Telegram API endpoint sending a single document,
+            with the chat ID already encoded in its query.
+        send_media_group_url (str): Telegram API endpoint sending several documents at once.
+        get_updates_url (httpx.URL): Telegram API endpoint reading the updates of the read bot,
+            with the chat ID already encoded in its query.
     """
 
     name: str
@@ -64,17 +80,148 @@ class Config:
     read_bot_token: str
     chat_id: str
     schedule_interval: str
+    xpath: Optional[etree.XPath] = field(default=None, repr=False, compare=False)
+    send_document_url: httpx.URL = field(
+        default_factory=httpx.URL, init=False, repr=False, compare=False
+    )
+    send_media_group_url: str = field(default="", init=False, repr=False, compare=False)
+    get_updates_url: httpx.URL = field(
+        default_factory=httpx.URL, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        # Build the Telegram endpoints once; the instance is frozen, hence object.__setattr__.
+        bot_api = f"https://api.telegram.org/bot{self.bot_token}"
+        chat = {"chat_id": self.chat_id}
+        object.__setattr__(
+            self, "send_document_url", httpx.URL(f"{bot_api}/sendDocument", params=chat)
+        )
+        object.__setattr__(self, "send_media_group_url", f"{bot_api}/sendMediaGroup")
+        object.__setattr__(
+            self,
+            "get_updates_url",
+            httpx.URL(f"https://api.telegram.org/bot{self.read_bot_token}/getUpdates", params=chat),
+        )
 
 
 class WebsiteFileWatcher:
     """Class for monitoring file changes on a website and sending alerts via Telegram."""
 
-    def __init__(self, config_file: str):
+    def __init__(
+        self,
+        config_file: str,
+        state_file: str = ".wwn_state.db",
+        verify_remote: bool = False,
+    ):
         """
         Initialize the WebsiteFileWatcher with configurations from the specified file.
+        The scraped files and the files sent to Telegram are kept between runs
+        in the SQLite database `state_file`.
+        With `verify_remote`, files never sent from here are checked against the last
+        Telegram message on the first scrape.
         """
         self.config: list[Config] = self._load_configs(config_file)
-        self.files: dict[str, str] = {}
+        self._url_to_configs: dict[str, list[Config]] = defaultdict(list)
+        for config in self.config:
+            self._url_to_configs[config.website].append(config)
+        self.verify_remote = verify_remote
+        self._db = self._open_state(state_file)
+        self.files: dict[str, str] = dict(self._db.execute("SELECT name, url FROM files"))
+        self._last_sent: dict[str, str] = dict(self._db.execute("SELECT name, url FROM last_sent"))
+        self._etags: dict[str, str] = {}
+        self._last_mod: dict[str, str] = {}
+        self.client = self._create_client()
+        # Keeps the BeautifulSoup parsing from blocking the event loop for a whole page. Its tree
+        # is built through Python callbacks holding the GIL, so one thread is all that helps.
+        self._parse_pool = ThreadPoolExecutor(max_workers=1)
+        # Caps the requests in flight per host, e.g. when many configs share api.telegram.org.
+        self._host_sems: dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(8))
+
+    async def __aenter__(self) -> "WebsiteFileWatcher":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Close the HTTP client, the parsing threads and the state database.
+        """
+        await self.client.aclose()
+        self._parse_pool.shutdown()
+        self._db.close()
+
+    @staticmethod
+    def _open_state(state_file: str) -> sqlite3.Connection:
+        """
+        Open the SQLite database keeping the state between runs, creating it if needed.
+        """
+        try:
+            db = sqlite3.connect(state_file)
+            db.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS files(name TEXT PRIMARY KEY, url TEXT);
+                CREATE TABLE IF NOT EXISTS last_sent(name TEXT PRIMARY KEY, url TEXT);
+                """
+            )
+            return db
+        except sqlite3.Error as e:
+            print(f"Cannot open the state database: {e}")
+            sys.exit()
+
+    def _save_file(self, name: str, url: str):
+        """
+        Store the last scraped file of a config, in memory and in the state database.
+        """
+        self.files[name] = url
+        with self._db:
+            self._db.execute(
+                "INSERT INTO files(name, url) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET url = excluded.url",
+                (name, url),
+            )
+
+    def _save_last_sent(self, name: str, url: str):
+        """
+        Store a file of a config sent to Telegram, in memory and in the state database,
+        both as its last scraped and its last sent file.
+        """
+        self._last_sent[name] = url
+        self._save_file(name, url)
+        with self._db:
+            self._db.execute(
+                "INSERT INTO last_sent(name, url) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET url = excluded.url",
+                (name, url),
+            )
+
+    def _send_failed(self, batch: list[tuple[Config, str]]):
+        """
+        Forget the validators of the websites whose files could not be sent, so the next
+        scrape downloads them again instead of reusing the previous, unsent result.
+        """
+        for config, _ in batch:
+            self._etags.pop(config.website, None)
+            self._last_mod.pop(config.website, None)
+
+    @staticmethod
+    def _create_client() -> httpx.AsyncClient:
+        """
+        Create an HTTP client reusing keep-alive (and HTTP/2) connections across requests.
+        """
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            retries=2,
+        )
+        # Follow redirects like requests did, httpx does not by default.
+        return httpx.AsyncClient(
+            transport=transport,
+            headers={"User-Agent": "WebWatchNotify/1.0"},
+            follow_redirects=True,
+        )
 
     @staticmethod
     def _load_configs(config_file: str) -> List[Config]:
@@ -83,113 +230,376 @@ class WebsiteFileWatcher:
         Handling the case where 'params' key might be missing for some steps.
         """
         try:
-            with open(config_file, "r", encoding="UTF-8") as f:
-                data = json.load(f)
-                return [
-                    Config(
-                        name=config["name"],
-                        website=config["website"],
-                        steps=[
-                            Step(method=step["method"], params=StepParams(**step.get("params", {})))
-                            for step in config["steps"]
-                        ],
-                        bot_token=config["bot_token"],
-                        read_bot_token=config["read_bot_token"],
-                        chat_id=config["chat_id"],
-                        schedule_interval=config["schedule_interval"],
-                    )
-                    for config in data["configs"]
-                ]
-        except (OSError, json.JSONDecodeError) as e:
+            with open(config_file, "rb") as f:
+                data = orjson.loads(f.read())
+            raw_configs = data["configs"]
+            WebsiteFileWatcher._numbers_as_strings(raw_configs)
+            configs = msgspec.convert(raw_configs, List[Config])
+        except (OSError, orjson.JSONDecodeError) as e:
             print(f"Cannot read the json config file properly: {e}")
             sys.exit()
         except KeyError as e:
             print(f"Missing key in JSON data: {e}")
             sys.exit()
+        except msgspec.ValidationError as e:
+            print(f"Invalid JSON config: {e}")
+            sys.exit()
+        return [
+            replace(config, xpath=WebsiteFileWatcher._compile_steps(config.steps))
+            for config in configs
+        ]
+
+    @staticmethod
+    def _numbers_as_strings(raw_configs: object) -> None:
+        """
+        Turn a numeric chat_id or schedule_interval into a string in the raw configs,
+        since plain JSON numbers have always been accepted for them.
+        """
+        if not isinstance(raw_configs, list):
+            return
+        for raw in raw_configs:
+            if not isinstance(raw, dict):
+                continue
+            for key in ("chat_id", "schedule_interval"):
+                if isinstance(raw.get(key), int):
+                    raw[key] = str(raw[key])
+
+    @staticmethod
+    def _xpath_literal(text: str) -> str:
+        """
+        Quote a string as an XPath 1.0 literal.
+        """
+        if "'" not in text:
+            return f"'{text}'"
+        if '"' not in text:
+            return f'"{text}"'
+        return "concat('" + "', \"'\", '".join(text.split("'")) + "')"
+
+    @staticmethod
+    def _compile_steps(steps: List[Step]) -> Optional[etree.XPath]:
+        """
+        Fuse the steps into a single XPath expression equivalent to running them one by one.
+        Only chains ending with `get_attribute` can be fused, as their result is a plain string,
+        unless BeautifulSoup splits that attribute into a list of values, like `class` or `rel`.
+        Returns None for any other chain, which is then performed step by step on the soup.
+        """
+        if not steps or steps[-1].method != "get_attribute":
+            return None
+        name = steps[-1].params.name.lower()
+        list_attributes = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES.values()
+        if any(name in names for names in list_attributes):
+            return None
+
+        expr = ""
+        for step in steps[:-1]:
+            if step.method == "find_text":
+                # BeautifulSoup's find(string=...) matches comments as well as text.
+                literal = WebsiteFileWatcher._xpath_literal(step.params.text)
+                expr = f"({expr}//node()[self::text() or self::comment()][. = {literal}])[1]"
+            elif step.method == "parent":
+                expr += "/.."
+            elif step.method == "find_next_sibling":
+                expr += "/following-sibling::*[1]"
+            else:
+                return None
+        if not expr:
+            return None
+
+        try:
+            return etree.XPath(f"{expr}/@{steps[-1].params.name}")
+        except etree.XPathSyntaxError:
+            return None
 
     def _perform_step(self, element: BeautifulSoup, step: Step):
         """
         Perform a step on an element using BeautifulSoup as per the step configuration.
         """
-        step_methods: dict[str, Callable[[], Any]] = {
-            "find_text": lambda: element.find(string=step.params.text),
-            "parent": element.find_parent,
-            "find_next_sibling": element.find_next_sibling,
-            "get_attribute": lambda: element.get(step.params.name),
-        }
-        try:
-            return step_methods[step.method]()
-        except KeyError as exc:
-            raise ValueError(f"Invalid method: {step.method}") from exc
+        match step.method:
+            case "find_text":
+                return element.find(string=step.params.text)
+            case "parent":
+                return element.find_parent()
+            case "find_next_sibling":
+                return element.find_next_sibling()
+            case "get_attribute":
+                return element.get(step.params.name)
+            case _:
+                raise ValueError(f"Invalid method: {step.method}")
+
+    async def _fetch(self, url: httpx.URL) -> httpx.Response:
+        """
+        Perform a GET request through the shared HTTP client.
+        """
+        async with self._host_sems[url.netloc.decode("ascii")]:
+            return await self.client.get(url, timeout=10)
+
+    async def _scrape_website_for_file_urls(
+        self, website: str, configs: list[Config]
+    ) -> list[Optional[str]]:
+        """
+        Scrape a website once for the file URLs of all configs watching it.
+        A config whose file is not found on the page gets None.
+        """
+        headers = {}
+        if website in self._etags:
+            headers["If-None-Match"] = self._etags[website]
+        if website in self._last_mod:
+            headers["If-Modified-Since"] = self._last_mod[website]
+
+        async with (
+            self._host_sems[urlsplit(website).netloc],
+            self.client.stream("GET", website, headers=headers, timeout=10) as req,
+        ):
+            if req.status_code == 304:
+                # Configs whose file was not found on the unchanged page still have none.
+                return [self.files.get(config.name) for config in configs]
+            if not req.is_success:
+                raise httpx.HTTPStatusError(
+                    f"Unexpected status {req.status_code} from {website}",
+                    request=req.request,
+                    response=req,
+                )
+            # Validators are only stored for a full 200 response, and only once it was parsed.
+            validators = req.headers if req.status_code == 200 else httpx.Headers()
+
+            xpaths = [config.xpath for config in configs]
+            file_urls: Optional[list[Optional[str]]] = None
+            if all(xpath is not None for xpath in xpaths):
+                file_urls = await self._stream_xpaths(req, xpaths)
+            else:
+                content = await req.aread()
 
-    def _scrape_website_for_file_url(self, config: Config) -> str:
+        if file_urls is None:
+            loop = asyncio.get_running_loop()
+            file_urls = await loop.run_in_executor(
+                self._parse_pool, self._perform_steps_on_page, content, configs
+            )
+        if "ETag" in validators:
+            self._etags[website] = validators["ETag"]
+        if "Last-Modified" in validators:
+            self._last_mod[website] = validators["Last-Modified"]
+        return file_urls
+
+    def _perform_steps_on_page(
+        self, content: bytes, configs: list[Config]
+    ) -> list[Optional[str]]:
         """
-        Scrape a specific website for a file URL based on steps in the config.
+        Parse a page once with BeautifulSoup and perform the steps of every config on it.
         """
-        req = requests.get(config.website, timeout=10)
-        soup = BeautifulSoup(req.content, "html.parser")
+        # The steps only navigate the soup without modifying it, so all configs can share it.
+        root = BeautifulSoup(content, "lxml")
+        file_urls: list[Optional[str]] = []
+        for config in configs:
+            soup = root
+            for step in config.steps:
+                soup = self._perform_step(soup, step)
+                if soup is None:
+                    break
+            file_urls.append(None if soup is None else str(soup))
+        return file_urls
 
-        for step in config.steps:
-            soup = self._perform_step(soup, step)
+    @staticmethod
+    def _detect_encoding(chunk: bytes) -> tuple[bytes, str]:
+        """
+        Pick the encoding of a page from its first chunk, trying the candidates in the same order
+        as BeautifulSoup with lxml: byte order mark, declared encoding, guessed encoding, then
+        UTF-8 and Windows-1252. Returns the chunk without its byte order mark and the encoding.
+        """
+        detector = EncodingDetector(chunk, is_html=True)
+        for encoding in detector.encodings:
+            try:
+                # An incremental decoder lets a character cut at the end of the chunk pass.
+                codecs.getincrementaldecoder(encoding)().decode(detector.markup)
+            except (LookupError, UnicodeDecodeError):
+                continue
+            return detector.markup, encoding
+        return detector.markup, "utf-8"
 
-        return str(soup)
+    @staticmethod
+    async def _stream_xpaths(
+        response: httpx.Response, xpaths: list[etree.XPath]
+    ) -> list[Optional[str]]:
+        """
+        Evaluate the fused XPaths while the page is downloading and stop reading it
+        once they all match.
+        The partial tree is searched each time the downloaded size doubles, keeping the total
+        work linear in the page size. Matches are only accepted if they still hold after the next
+        chunk, so that a text node cut at a chunk boundary cannot match too early.
+        """
 
-    def _check_and_update_files(self, config: Config, element: str):
+        def first_matches(tree: etree._ElementTree) -> list[Optional[str]]:
+            return [next(map(str, xpath(tree)), None) for xpath in xpaths]
+
+        parser: Optional[etree.HTMLPullParser] = None
+        tree: Optional[etree._ElementTree] = None
+        previous: list[Optional[str]] = [None]
+        fed = searched = 0
+        async for chunk in response.aiter_bytes(65536):
+            if parser is None:
+                chunk, encoding = WebsiteFileWatcher._detect_encoding(chunk)
+                parser = etree.HTMLPullParser(events=("start",), encoding=encoding)
+            parser.feed(chunk)
+            fed += len(chunk)
+            for _, element in parser.read_events():
+                if tree is None:
+                    tree = element.getroottree()
+            if tree is None or (None in previous and fed < 2 * searched):
+                continue
+            searched = fed
+
+            current = first_matches(tree)
+            if None not in current and current == previous:
+                return current
+            previous = current
+
+        if parser is None:
+            return [None] * len(xpaths)
+        root = parser.close()
+        return first_matches(root if tree is None else tree)
+
+    async def _check_and_update_files(self, config: Config, element: str) -> bool:
         """
-        Check the scraped file and update if there are any changes.
+        Check the scraped file, telling whether it should be sent to Telegram.
+        The file is compared with the last one sent, so a file whose sending failed is retried.
+        Configs that never sent anything compare with the last scraped file instead.
+        Unchanged files are stored right away, changed ones only once they are sent.
         """
-        if self.files.get(config.name) != element:
-            if config.name in self.files:
-                print("Changes detected")
-                self._send_file_to_telegram(config)
-            self.files[config.name] = element
+        previous = self.files.get(config.name)
+        if config.name in self._last_sent:
+            changed = self._last_sent[config.name] != element
+        elif previous is not None:
+            changed = previous != element
+        else:
+            changed = await self._differs_from_telegram(config, element)
+
+        if changed:
+            print("Changes detected")
         else:
             print("No change in file detected")
+            if previous != element:
+                self._save_file(config.name, element)
+        return changed
 
-    def scrape_websites(self):
+    async def _differs_from_telegram(self, config: Config, element: str) -> bool:
         """
-        Scrape all websites as per the loaded configurations.
+        Tell whether the first file ever scraped for a config differs from the last Telegram
+        message. Telegram is only asked when `verify_remote` is set.
         """
-        for config in self.config:
-            file_url = self._scrape_website_for_file_url(config)
+        if not self.verify_remote:
+            return False
+        last_msg = await self.read_last_message_from_telegram(config)
+        return last_msg != urlsplit(element).path.rpartition("/")[2]
+
+    async def _scrape_one(self, website: str, configs: list[Config]) -> list[tuple[Config, str]]:
+        """
+        Scrape a single website, returning the configs and file URLs of the changed files.
+        """
+        file_urls = await self._scrape_website_for_file_urls(website, configs)
+        changed = []
+        for config, file_url in zip(configs, file_urls):
+            if file_url is None:
+                print(f"File not found on the website for {config.name}")
+                continue
             print("File URL: ", file_url)
-            self._check_and_update_files(config, file_url)
+            if await self._check_and_update_files(config, file_url):
+                changed.append((config, file_url))
+        return changed
 
-    def _send_file_to_telegram(self, config: Config):
+    async def scrape_websites(self, websites: Optional[list[str]] = None):
         """
-        Send a file to a Telegram chat.
+        Scrape the given websites, or all of them, concurrently as per the loaded configurations
+        and send the changed files to Telegram.
         """
-        file_url = self.files[config.name]
-        url = (
-            "https://api.telegram.org/bot"
-            + config.bot_token
-            + "/sendDocument?chat_id="
-            + config.chat_id
-            + "&document="
-            + file_url
+        if websites is None:
+            websites = list(self._url_to_configs)
+        results = await asyncio.gather(
+            *(self._scrape_one(website, self._url_to_configs[website]) for website in websites),
+            return_exceptions=True,
         )
+        pending: list[tuple[Config, str]] = []
+        for website, result in zip(websites, results):
+            if isinstance(result, Exception):
+                print(f"Cannot scrape {website}: {result!r}")
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                pending.extend(result)
+        await self._flush_pending(pending)
+
+    async def _flush_pending(self, pending: list[tuple[Config, str]]):
+        """
+        Send the changed files to Telegram, batching files for the same bot and chat
+        into media groups of up to 10 documents.
+        """
+        batches: dict[tuple[str, str], list[tuple[Config, str]]] = {}
+        for config, file_url in pending:
+            batches.setdefault((config.bot_token, config.chat_id), []).append((config, file_url))
+
+        sends = []
+        for batch in batches.values():
+            for i in range(0, len(batch), 10):
+                chunk = batch[i : i + 10]
+                if len(chunk) == 1:
+                    sends.append(self._send_file_to_telegram(*chunk[0]))
+                else:
+                    sends.append(self._send_media_group_to_telegram(chunk))
+        await asyncio.gather(*sends)
+
+    async def _send_media_group_to_telegram(self, batch: list[tuple[Config, str]]):
+        """
+        Send several files to a Telegram chat in a single message.
+        All configs in the batch must share the bot token and chat ID.
+        """
+        config = batch[0][0]
+        media = [{"type": "document", "media": file_url} for _, file_url in batch]
+
+        try:
+            async with self._host_sems[urlsplit(config.send_media_group_url).netloc]:
+                response = await self.client.post(
+                    config.send_media_group_url,
+                    json={"chat_id": config.chat_id, "media": media},
+                    timeout=10,
+                )
+        except httpx.HTTPError as e:
+            print(f"Error sending files to Telegram: {e!r}")
+            self._send_failed(batch)
+            return
+
+        if response.status_code == 200:
+            print(f"{len(batch)} new files sent to Telegram")
+            for sent_config, file_url in batch:
+                self._save_last_sent(sent_config.name, file_url)
+        else:
+            print("Error sending files to Telegram")
+            print(response.text)
+            self._send_failed(batch)
 
-        response = requests.get(url, timeout=10)
+    async def _send_file_to_telegram(self, config: Config, file_url: str):
+        """
+        Send a file to a Telegram chat.
+        """
+        try:
+            response = await self._fetch(
+                config.send_document_url.copy_add_param("document", file_url)
+            )
+        except httpx.HTTPError as e:
+            print(f"Error sending file to Telegram: {e!r}")
+            self._send_failed([(config, file_url)])
+            return
 
         if response.status_code == 200:
             print("New file sent to Telegram")
+            self._save_last_sent(config.name, file_url)
         else:
             print("Error sending file to Telegram")
             print(response.text)
+            self._send_failed([(config, file_url)])
 
-    def read_last_message_from_telegram(self, config: Config) -> str:
+    async def read_last_message_from_telegram(self, config: Config) -> str:
         """
         Read the last message from a Telegram chat.
         """
-        url = (
-            "https://api.telegram.org/bot"
-            + config.read_bot_token
-            + "/getUpdates"
-            + "?chat_id="
-            + config.chat_id
-        )
-
-        response = requests.get(url, timeout=10)
+        response = await self._fetch(config.get_updates_url)
         if response.status_code != 200:
             print("Error reading last message from Telegram")
             print(response.text)
@@ -203,35 +613,42 @@ class WebsiteFileWatcher:
         except IndexError:
             return ""
 
-    def check_for_file_changes(self):
-        """
-        Check if there are any changes in the files and send them to Telegram.
-        """
-        for config in self.config:
-            last_msg = self.read_last_message_from_telegram(config)
-            file_name = self.files[config.name].split("/")[-1]
-
-            if last_msg != file_name:
-                print("Change in file detected")
-                self._send_file_to_telegram(config)
-            else:
-                print("No change in file detected")
-
-    def run_schedule(self):
+    async def run_schedule(self) -> None:
         """
         Start the scheduler to scrape the websites at specified intervals.
         """
         print("Scheduler started")
-        for config in self.config:
-            schedule.every(int(config.schedule_interval)).minutes.do(  # type: ignore # external lib
-                self.scrape_websites
-            )
-        try:
-            while True:
-                schedule.run_pending()
-                time.sleep(1)
-        except KeyboardInterrupt:
-            print("\nProgram terminated by user. Bye!")
+        due: list[str] = []
+        for website, configs in self._url_to_configs.items():
+            # One job per website, so a page shared by several configs is fetched once per
+            # interval, at the shortest interval among them.
+            interval = min(int(config.schedule_interval) for config in configs)
+            # A random second within the minute keeps the websites from being fetched all at once.
+            schedule.every(interval).minutes.at(  # type: ignore # external lib
+                f":{random.randint(0, 59):02d}"
+            ).do(due.append, website)
+        while True:
+            schedule.run_pending()
+            if due:
+                # Websites due together are scraped together, so their files share the batches.
+                websites = due.copy()
+                due.clear()
+                await self.scrape_websites(websites)
+            # Sleep right until the next job is due instead of polling the scheduler.
+            delay = schedule.idle_seconds()
+            if delay is None:
+                break
+            await asyncio.sleep(max(0, delay))
+
+    async def run(self, check_once: bool):
+        """
+        Check the websites once, then keep watching them unless `check_once` is set.
+        """
+        async with self:
+            await self.scrape_websites()
+
+            if not check_once:
+                await self.run_schedule()
 
 
 def parse_arguments() -> argparse.Namespace:
@@ -247,6 +664,19 @@ def parse_arguments() -> argparse.Namespace:
         default=False,
         help="Run check once, without scheduler.",
     )
+    parser.add_argument(
+        "-sf",
+        "--state_file",
+        default=".wwn_state.db",
+        help="The SQLite database remembering the files seen and sent to Telegram.",
+    )
+    parser.add_argument(
+        "-vr",
+        "--verify_remote",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="On the first check, compare files never sent before with the last Telegram message.",
+    )
 
     return parser.parse_args()
 
@@ -256,12 +686,11 @@ def main():
     Main function to start the file watcher and optionally the scheduler.
     """
     args = parse_arguments()
-    watcher = WebsiteFileWatcher(args.json_config)
-    watcher.scrape_websites()
-    watcher.check_for_file_changes()
-
-    if not args.check_once:
-        watcher.run_schedule()
+    watcher = WebsiteFileWatcher(args.json_config, args.state_file, args.verify_remote)
+    try:
+        asyncio.run(watcher.run(args.check_once))
+    except KeyboardInterrupt:
+        print("\nProgram terminated by user. Bye!")
 
 
 if __name__ == "__main__":